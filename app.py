@@ -5,13 +5,15 @@ Date: August 28, 2025
 """
 
 import streamlit as st
-import requests
+import httpx
+import asyncio
+import threading
 import json
 import time
-import os
+import re
 from pathlib import Path
-import tempfile
-from typing import Dict, Any
+from concurrent.futures import Future
+from typing import Dict, Any, Optional, Tuple
 
 # Page configuration
 st.set_page_config(
@@ -22,8 +24,7 @@ st.set_page_config(
 )
 
 # Custom CSS for better styling
-st.markdown("""
-<style>
+CUSTOM_CSS = """
     .main-header {
         text-align: center;
         padding: 2rem 0;
@@ -33,54 +34,147 @@ st.markdown("""
         border-radius: 10px;
     }
     
-    .metric-container {
-        background: #f0f2f6;
-        padding: 1rem;
-        border-radius: 10px;
-        margin: 1rem 0;
-    }
-    
-    .caption-box {
-        background: white;
-        padding: 1.5rem;
-        border-radius: 10px;
-        border-left: 4px solid #667eea;
-        margin: 1rem 0;
-        box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-    }
-    
-    .success-message {
-        background: #d4edda;
-        color: #155724;
-        padding: 1rem;
-        border-radius: 5px;
-        border-left: 4px solid #28a745;
-    }
-    
-    .error-message {
-        background: #f8d7da;
-        color: #721c24;
-        padding: 1rem;
-        border-radius: 5px;
-        border-left: 4px solid #dc3545;
-    }
-    
     .processing-spinner {
         text-align: center;
         padding: 2rem;
     }
-</style>
-""", unsafe_allow_html=True)
+"""
+
+@st.cache_resource(show_spinner=False)
+def _compiled_css() -> str:
+    """Minify the custom CSS into a <style> tag once per process"""
+    css = re.sub(r"\s+", " ", CUSTOM_CSS)
+    css = re.sub(r"\s*([{}:;,])\s*", r"\1", css).strip()
+    return f"<style>{css}</style>"
+
+# Streamlit drops elements a rerun doesn't emit, so the tag is written every run
+st.markdown(_compiled_css(), unsafe_allow_html=True)
 
 # Configuration
 API_URL = "http://localhost:8000"
 MAX_FILE_SIZE = 100 * 1024 * 1024  # 100MB
+HEALTH_CACHE_TTL = 5  # seconds
+CAPTION_STYLES = ["professional", "creative", "accessible"]  # generated in one GPT request
+
+# Backend model states: loaded in the API process, or served by a separate ASR / vision service
+MODEL_STATUS_ICONS = {"loaded": "✅", "remote": "🌐"}
+
+# Human-readable labels for the stages reported on /progress
+STAGE_LABELS = {
+    "uploading": "Uploading video",
+    "queued": "Waiting to start",
+    "loading": "Loading video",
+    "analyzing": "Transcribing audio and analyzing frames",
+    "generating_captions": "Generating captions",
+    "completed": "Finishing up"
+}
+
+@st.cache_resource(show_spinner=False)
+def _get_event_loop() -> asyncio.AbstractEventLoop:
+    """Background event loop that drives every API call, off the script thread"""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="api-client-loop", daemon=True).start()
+    return loop
+
+@st.cache_resource(show_spinner=False)
+def _get_client(api_url: str) -> httpx.AsyncClient:
+    """Shared async client so API calls reuse pooled keep-alive connections"""
+    return httpx.AsyncClient(
+        base_url=api_url,
+        timeout=300,  # 5 minutes timeout
+        limits=httpx.Limits(max_connections=8, max_keepalive_connections=4)
+    )
+
+def _submit(coro) -> Future:
+    """Schedule a coroutine on the background loop"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_event_loop())
+
+async def _fetch_health(client: httpx.AsyncClient) -> Optional[Dict[str, Any]]:
+    """Probe the API health endpoint"""
+    try:
+        response = await client.get("/health", timeout=5)
+        if response.status_code == 200:
+            return response.json()
+    except httpx.HTTPError:
+        pass
+    return None
+
+@st.cache_data(ttl=HEALTH_CACHE_TTL, show_spinner=False)
+def _cached_health(api_url: str) -> Optional[Dict[str, Any]]:
+    """Probe the API health endpoint, cached briefly across reruns"""
+    return _submit(_fetch_health(_get_client(api_url))).result()
+
+@st.cache_data(show_spinner=False)
+def _serialize_json(payload: Dict[str, Any], indent: Optional[int] = 2) -> str:
+    """Serialize a payload to JSON once per distinct result"""
+    return json.dumps(payload, indent=indent)
+
+@st.cache_data(show_spinner=False)
+def _serialize_text(captions: Dict[str, str]) -> str:
+    """Render captions as plain text once per distinct result"""
+    return "\n\n".join([
+        f"=== {style.upper()} STYLE ===\n{caption}"
+        for style, caption in captions.items()
+    ])
+
+async def _run_job(client: httpx.AsyncClient, uploaded_file, progress: Dict[str, Any]) -> Tuple[bool, Any]:
+    """Upload a video as a job and follow its progress stream (runs on the background loop, no st.* calls)"""
+    try:
+        # httpx streams the file part straight from the upload buffer
+        uploaded_file.seek(0)
+        response = await client.post(
+            "/jobs",
+            files={"file": (uploaded_file.name, uploaded_file, uploaded_file.type)},
+            data={"styles": ",".join(CAPTION_STYLES)}
+        )
+        
+        if response.status_code != 200:
+            error_detail = response.json().get("detail", "Unknown error")
+            return False, f"API Error: {error_detail}"
+        
+        job_id = response.json()["job_id"]
+        progress["job_id"] = job_id
+        progress["stage"] = "queued"
+        
+        # Server-Sent Events: one "data: {...}" line per progress update
+        async with client.stream("GET", f"/progress/{job_id}") as stream:
+            async for line in stream.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                
+                event = json.loads(line[len("data:"):])
+                progress["stage"] = event["stage"]
+                progress["value"] = event["progress"]
+                
+                if event["status"] == "completed":
+                    return True, event["result"]
+                if event["status"] == "failed":
+                    return False, f"API Error: {event.get('error') or 'Unknown error'}"
+                if event["status"] == "cancelled":
+                    return False, "Processing cancelled"
+        
+        return False, "Progress stream ended before processing finished"
+            
+    except httpx.TimeoutException:
+        return False, "Processing timeout. Please try with a shorter video."
+    except httpx.HTTPError as e:
+        return False, f"Network error: {str(e)}"
+    except Exception as e:
+        return False, f"Unexpected error: {str(e)}"
+
+async def _cancel_job(client: httpx.AsyncClient, job_id: str):
+    """Ask the API to stop a running job; its progress stream reports the outcome"""
+    try:
+        await client.post(f"/cancel/{job_id}", timeout=5)
+    except httpx.HTTPError:
+        pass
 
 class VideoProcessorUI:
     """Main UI class for the video processing application"""
     
     def __init__(self):
         self.api_url = API_URL
+        self.client = _get_client(API_URL)
         
     def render_header(self):
         """Render the main header"""
@@ -93,74 +187,76 @@ class VideoProcessorUI:
         
     def render_sidebar(self):
         """Render the sidebar with information and controls"""
+        # Fragments must be called inside `with st.sidebar`, not write to it themselves
         with st.sidebar:
-            st.header("🔧 System Information")
+            self.render_sidebar_content()
+    
+    @st.fragment
+    def render_sidebar_content(self):
+        """Sidebar body; isolated so main-pane fragment reruns don't re-probe the API"""
+        health_status = self.check_api_health()
+        
+        st.header("🔧 System Information")
+        
+        if health_status:
+            st.success("✅ API is running")
             
-            # Check API health
-            health_status = self.check_api_health()
+            # Display model status
+            st.subheader("📊 Model Status")
+            models = health_status.get("models", {})
             
-            if health_status:
-                st.markdown('<div class="success-message">✅ API is running</div>', unsafe_allow_html=True)
-                
-                # Display model status
-                st.subheader("📊 Model Status")
-                models = health_status.get("models", {})
-                
-                col1, col2 = st.columns(2)
-                with col1:
-                    whisper_status = "✅" if models.get("whisper") == "loaded" else "❌"
-                    st.write(f"Whisper: {whisper_status}")
-                    
-                with col2:
-                    clip_status = "✅" if models.get("clip") == "loaded" else "❌"
-                    st.write(f"CLIP: {clip_status}")
-                
-                # Device info
-                device = health_status.get("device", "unknown")
-                st.write(f"**Device:** {device}")
-                
-                # OpenAI status
-                openai_status = "✅" if health_status.get("openai_configured") else "⚠️"
-                st.write(f"**OpenAI:** {openai_status}")
-                
-                if not health_status.get("openai_configured"):
-                    st.warning("Set OPENAI_API_KEY environment variable for enhanced captions")
-                    
-            else:
-                st.markdown('<div class="error-message">❌ API not running</div>', unsafe_allow_html=True)
-                st.error("Please start the FastAPI backend first")
-                
-            st.divider()
+            col1, col2 = st.columns(2)
+            with col1:
+                st.write(f"Whisper: {MODEL_STATUS_ICONS.get(models.get('whisper'), '❌')}")
             
-            # File requirements
-            st.subheader("📋 Requirements")
-            st.write("**Supported formats:** MP4, MOV, AVI")
-            st.write("**Max file size:** 100MB")
-            st.write("**Max duration:** 2 minutes")
-            st.write("**Optimal:** Clear audio, good lighting")
+            with col2:
+                st.write(f"CLIP: {MODEL_STATUS_ICONS.get(models.get('clip'), '❌')}")
             
-            st.divider()
+            # Device info
+            device = health_status.get("device", "unknown")
+            st.write(f"**Device:** {device}")
             
-            # About section
-            st.subheader("ℹ️ About")
-            st.write("""
-            This system combines:
-            - **Whisper** for speech recognition
-            - **CLIP** for visual analysis  
-            - **GPT-3.5** for caption enhancement
-            - **FastAPI** backend
-            - **Streamlit** frontend
-            """)
-    
+            # OpenAI status
+            openai_status = "✅" if health_status.get("openai_configured") else "⚠️"
+            st.write(f"**OpenAI:** {openai_status}")
+            
+            if not health_status.get("openai_configured"):
+                st.warning("Set OPENAI_API_KEY environment variable for enhanced captions")
+        
+        else:
+            st.error("❌ API not running")
+            st.error("Please start the FastAPI backend first")
+        
+        st.divider()
+        
+        # File requirements
+        st.subheader("📋 Requirements")
+        st.write("**Supported formats:** MP4, MOV, AVI")
+        st.write("**Max file size:** 100MB")
+        st.write("**Max duration:** 2 minutes")
+        st.write("**Optimal:** Clear audio, good lighting")
+        
+        st.divider()
+        
+        # About section
+        st.subheader("ℹ️ About")
+        st.write("""
+        This system combines:
+        - **Whisper** for speech recognition
+        - **CLIP** for visual analysis  
+        - **GPT-3.5** for caption enhancement
+        - **FastAPI** backend
+        - **Streamlit** frontend
+        """)
+
     def check_api_health(self):
-        """Check if the API is running and healthy"""
-        try:
-            response = requests.get(f"{self.api_url}/health", timeout=5)
-            if response.status_code == 200:
-                return response.json()
-        except requests.exceptions.RequestException:
-            pass
-        return None
+        """Check if the API is running and healthy, reusing this session's recent answer"""
+        now = time.monotonic()
+        cached = st.session_state.get("_health")
+        if cached is None or now - cached[0] > HEALTH_CACHE_TTL:
+            cached = (now, _cached_health(self.api_url))
+            st.session_state["_health"] = cached
+        return cached[1]
     
     def validate_file(self, uploaded_file):
         """Validate uploaded file"""
@@ -178,37 +274,49 @@ class VideoProcessorUI:
         
         return True, "File is valid"
     
-    def process_video(self, uploaded_file):
-        """Send video to API for processing"""
-        try:
-            # Prepare file for upload
-            files = {"file": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)}
-            
-            # Send request
-            with st.spinner("🔄 Processing video... This may take a few minutes."):
-                response = requests.post(
-                    f"{self.api_url}/process-video",
-                    files=files,
-                    timeout=300  # 5 minutes timeout
-                )
+    def process_video(self, uploaded_file, progress: Dict[str, Any]) -> Future:
+        """Send video to API for processing on the background loop"""
+        return _submit(_run_job(self.client, uploaded_file, progress))
+    
+    @st.fragment(run_every=0.5)
+    def render_processing_status(self):
+        """Show job progress and switch to results once it finishes"""
+        future = st.session_state.upload_future
+        progress = st.session_state.job_progress
+        
+        if not future.done():
+            stage = STAGE_LABELS.get(progress["stage"], progress["stage"])
+            st.progress(progress["value"], text=f"🔄 {stage}... This may take a few minutes.")
             
-            if response.status_code == 200:
-                return True, response.json()
-            else:
-                error_detail = response.json().get("detail", "Unknown error")
-                return False, f"API Error: {error_detail}"
-                
-        except requests.exceptions.Timeout:
-            return False, "Processing timeout. Please try with a shorter video."
-        except requests.exceptions.RequestException as e:
-            return False, f"Network error: {str(e)}"
-        except Exception as e:
-            return False, f"Unexpected error: {str(e)}"
+            if st.button("⏹️ Cancel", type="secondary"):
+                if progress["job_id"]:
+                    _submit(_cancel_job(self.client, progress["job_id"]))
+                else:
+                    # Still uploading, so there is no server-side job to cancel yet
+                    future.cancel()
+            return
+        
+        if future.cancelled():
+            success, result = False, "Processing cancelled"
+        else:
+            success, result = future.result()
+        st.session_state.upload_future = None
+        
+        if success:
+            st.session_state.processing_result = result
+            st.session_state.show_results = True
+        else:
+            st.session_state.upload_error = result
+        st.rerun()
     
     def render_upload_section(self):
         """Render the file upload section"""
         st.header("📤 Upload Video")
         
+        # Surface the outcome of the last background upload
+        if st.session_state.upload_error:
+            st.error(f"❌ {st.session_state.upload_error}")
+        
         uploaded_file = st.file_uploader(
             "Choose a video file",
             type=['mp4', 'mov', 'avi'],
@@ -233,14 +341,12 @@ class VideoProcessorUI:
                 
                 # Process button
                 if st.button("🚀 Process Video", type="primary", use_container_width=True):
-                    success, result = self.process_video(uploaded_file)
-                    
-                    if success:
-                        st.session_state.processing_result = result
-                        st.session_state.show_results = True
-                        st.rerun()
-                    else:
-                        st.error(f"❌ {result}")
+                    st.session_state.upload_error = None
+                    st.session_state.job_progress = {"job_id": None, "stage": "uploading", "value": 0.0}
+                    st.session_state.upload_future = self.process_video(
+                        uploaded_file, st.session_state.job_progress
+                    )
+                    st.rerun()
                         
             else:
                 st.error(f"❌ {message}")
@@ -251,15 +357,21 @@ class VideoProcessorUI:
         """Render processing results"""
         st.header("📊 Processing Results")
         
+        # Unpack each section once and hand the pieces to the tabs
+        video_info = result.get("video_info", {})
+        transcript = result.get("transcript", {})
+        visual_analysis = result.get("visual_analysis", {})
+        enhanced_captions = result.get("enhanced_captions", {})
+        
         # Processing summary
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            duration = result.get("video_info", {}).get("duration", 0)
+            duration = video_info.get("duration", 0)
             st.metric("Video Duration", f"{duration:.1f}s")
             
         with col2:
-            confidence = result.get("transcript", {}).get("confidence", 0)
+            confidence = transcript.get("confidence", 0)
             st.metric("Speech Confidence", f"{confidence:.1%}")
             
         with col3:
@@ -267,20 +379,20 @@ class VideoProcessorUI:
             st.metric("Processing Time", f"{processing_time:.1f}s")
             
         with col4:
-            frame_count = result.get("visual_analysis", {}).get("frame_count", 0)
+            frame_count = visual_analysis.get("frame_count", 0)
             st.metric("Frames Analyzed", str(frame_count))
         
         # Tabs for different results
         tab1, tab2, tab3, tab4 = st.tabs(["🎙️ Transcript", "👁️ Visual Analysis", "✨ Enhanced Captions", "📄 Raw Data"])
         
         with tab1:
-            self.render_transcript_tab(result.get("transcript", {}))
+            self.render_transcript_tab(transcript)
             
         with tab2:
-            self.render_visual_tab(result.get("visual_analysis", {}))
+            self.render_visual_tab(visual_analysis)
             
         with tab3:
-            self.render_captions_tab(result.get("enhanced_captions", {}), result)
+            self.render_captions_tab(enhanced_captions, video_info, result.get("timestamp", ""))
             
         with tab4:
             self.render_raw_data_tab(result)
@@ -299,7 +411,8 @@ class VideoProcessorUI:
             st.markdown(f"**Overall Confidence:** {confidence:.1%}")
             
             st.markdown("### Full Transcript")
-            st.markdown(f'<div class="caption-box">{text}</div>', unsafe_allow_html=True)
+            with st.container(border=True):
+                st.write(text)
             
             # Segments timeline
             segments = transcript.get("segments", [])
@@ -330,20 +443,24 @@ class VideoProcessorUI:
         
         with col1:
             st.markdown("**Scene Type:**")
-            st.markdown(f'<div class="metric-container">{scene_type.replace("_", " ").title()}</div>', unsafe_allow_html=True)
+            with st.container(border=True):
+                st.write(scene_type.replace("_", " ").title())
             
         with col2:
             st.markdown("**Objects Detected:**")
             if objects:
                 objects_text = ", ".join(objects[:8])  # Show first 8 objects
-                st.markdown(f'<div class="metric-container">{objects_text}</div>', unsafe_allow_html=True)
+                with st.container(border=True):
+                    st.write(objects_text)
             else:
-                st.markdown('<div class="metric-container">No objects detected</div>', unsafe_allow_html=True)
+                with st.container(border=True):
+                    st.write("No objects detected")
         
         # Scene description
         if description:
             st.markdown("**Scene Description:**")
-            st.markdown(f'<div class="caption-box">{description}</div>', unsafe_allow_html=True)
+            with st.container(border=True):
+                st.write(description)
         
         # Individual frame analysis (if available)
         individual_frames = visual_analysis.get("individual_frames", [])
@@ -360,7 +477,7 @@ class VideoProcessorUI:
                     st.write(f"**Objects:** {', '.join(frame_objects[:5])}")
                     st.write(f"**Description:** {frame_desc}")
     
-    def render_captions_tab(self, enhanced_captions: Dict[str, str], result: Dict[str, Any]):
+    def render_captions_tab(self, enhanced_captions: Dict[str, str], video_info: Dict[str, Any], timestamp: str):
         """Render enhanced captions"""
         st.subheader("✨ AI-Enhanced Captions")
         
@@ -371,17 +488,20 @@ class VideoProcessorUI:
         # Professional caption
         if "professional" in enhanced_captions:
             st.markdown("### 📊 Professional Style")
-            st.markdown(f'<div class="caption-box">{enhanced_captions["professional"]}</div>', unsafe_allow_html=True)
+            with st.container(border=True):
+                st.write(enhanced_captions["professional"])
         
         # Creative caption
         if "creative" in enhanced_captions:
             st.markdown("### 🎨 Creative Style")
-            st.markdown(f'<div class="caption-box">{enhanced_captions["creative"]}</div>', unsafe_allow_html=True)
+            with st.container(border=True):
+                st.write(enhanced_captions["creative"])
         
         # Accessible caption
         if "accessible" in enhanced_captions:
             st.markdown("### ♿ Accessible Style")
-            st.markdown(f'<div class="caption-box">{enhanced_captions["accessible"]}</div>', unsafe_allow_html=True)
+            with st.container(border=True):
+                st.write(enhanced_captions["accessible"])
         
         # Download options
         st.markdown("### 💾 Download Options")
@@ -389,15 +509,15 @@ class VideoProcessorUI:
         # Prepare download data
         download_data = {
             "enhanced_captions": enhanced_captions,
-            "timestamp": result.get("timestamp", ""),
-            "video_info": result.get("video_info", {})
+            "timestamp": timestamp,
+            "video_info": video_info
         }
         
         col1, col2 = st.columns(2)
         
         with col1:
             # JSON download
-            json_data = json.dumps(download_data, indent=2)
+            json_data = _serialize_json(download_data)
             st.download_button(
                 label="📄 Download as JSON",
                 data=json_data,
@@ -407,10 +527,7 @@ class VideoProcessorUI:
         
         with col2:
             # Text download
-            text_data = "\n\n".join([
-                f"=== {style.upper()} STYLE ===\n{caption}"
-                for style, caption in enhanced_captions.items()
-            ])
+            text_data = _serialize_text(enhanced_captions)
             st.download_button(
                 label="📝 Download as Text",
                 data=text_data,
@@ -421,7 +538,8 @@ class VideoProcessorUI:
     def render_raw_data_tab(self, result: Dict[str, Any]):
         """Render raw JSON data"""
         st.subheader("📄 Raw Processing Data")
-        st.json(result)
+        # A pre-serialized string skips st.json's own dump on every rerun
+        st.json(_serialize_json(result, indent=None), expanded=False)
     
     def render_sample_videos_section(self):
         """Render sample videos section"""
@@ -456,13 +574,27 @@ class VideoProcessorUI:
             st.session_state.show_results = False
         if 'processing_result' not in st.session_state:
             st.session_state.processing_result = None
+        if 'upload_future' not in st.session_state:
+            st.session_state.upload_future = None
+        if 'upload_error' not in st.session_state:
+            st.session_state.upload_error = None
+        if 'job_progress' not in st.session_state:
+            st.session_state.job_progress = None
+        
+        # Probe the API once per rerun and share the result
+        health_status = self.check_api_health()
         
         # Render components
         self.render_header()
         self.render_sidebar()
         
+        # Keep polling while an upload is in flight, even if the busy API misses a health probe
+        if st.session_state.upload_future is not None:
+            self.render_processing_status()
+            return
+        
         # Main content area
-        if not self.check_api_health():
+        if not health_status:
             st.error("🚨 **API Server Not Running**")
             st.markdown("""
             Please start the FastAPI backend first:
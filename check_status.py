@@ -6,6 +6,14 @@ import requests
 import subprocess
 import sys
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+# Shared session so repeated probes reuse keep-alive connections
+SESSION = requests.Session()
+
+API_HEALTH_URL = "http://localhost:8000/health"
+FRONTEND_URL = "http://localhost:8502"
+PROBE_TIMEOUT = 5  # seconds, shared by every probe
 
 def check_services():
     print("🔍 Video Caption Enhancement System - Status Check")
@@ -13,11 +21,20 @@ def check_services():
     print(f"🕐 Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print()
     
+    api_ok = False
+    frontend_ok = False
+    
+    # Fire both probes at once so a down service costs one timeout, not two
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        api_future = executor.submit(SESSION.get, API_HEALTH_URL, timeout=PROBE_TIMEOUT)
+        healthz_future = executor.submit(SESSION.get, f"{FRONTEND_URL}/healthz", timeout=PROBE_TIMEOUT)
+    
     # Check FastAPI Backend
     print("🚀 Checking FastAPI Backend (http://localhost:8000)...")
     try:
-        response = requests.get("http://localhost:8000/health", timeout=5)
+        response = api_future.result()
         if response.status_code == 200:
+            api_ok = True
             data = response.json()
             print("✅ FastAPI Backend: RUNNING")
             print(f"   - Models: Whisper={data['models']['whisper']}, CLIP={data['models']['clip']}")
@@ -36,48 +53,37 @@ def check_services():
     # Check Streamlit Frontend
     print("🌐 Checking Streamlit Frontend (http://localhost:8502)...")
     try:
-        response = requests.get("http://localhost:8502/healthz", timeout=5)
-        print("✅ Streamlit Frontend: RUNNING")
+        # Streamlit serves /healthz itself, so no root page probe is needed
+        response = healthz_future.result()
+        if response.status_code == 200:
+            frontend_ok = True
+            print("✅ Streamlit Frontend: RUNNING")
+        else:
+            print(f"❌ Streamlit Frontend: ERROR (Status: {response.status_code})")
     except requests.exceptions.ConnectionError:
         print("❌ Streamlit Frontend: NOT RUNNING")
         print("   ➤ Start with: streamlit run app.py --server.port=8502")
     except Exception as e:
-        # Streamlit doesn't have healthz, try a different approach
-        try:
-            response = requests.get("http://localhost:8502", timeout=5)
-            if response.status_code == 200:
-                print("✅ Streamlit Frontend: RUNNING")
-            else:
-                print(f"❌ Streamlit Frontend: ERROR (Status: {response.status_code})")
-        except:
-            print("❌ Streamlit Frontend: NOT RUNNING")
-            print("   ➤ Start with: streamlit run app.py --server.port=8502")
+        print(f"❌ Streamlit Frontend: ERROR - {e}")
     
     print()
     print("=" * 60)
     
-    # Summary
-    try:
-        api_ok = requests.get("http://localhost:8000/health", timeout=2).status_code == 200
-        frontend_ok = requests.get("http://localhost:8502", timeout=2).status_code == 200
-        
-        if api_ok and frontend_ok:
-            print("🎉 System Status: ALL SERVICES RUNNING")
-            print("🌐 Frontend URL: http://localhost:8502")
-            print("📡 API URL: http://localhost:8000")
-            print("📚 API Docs: http://localhost:8000/docs")
-        elif api_ok:
-            print("⚠️  System Status: API ONLY (Frontend down)")
-        elif frontend_ok:
-            print("⚠️  System Status: FRONTEND ONLY (API down)")
-        else:
-            print("❌ System Status: ALL SERVICES DOWN")
-            print("\n🔧 Quick Fix:")
-            print("1. Start API: python main.py")
-            print("2. Start Frontend: streamlit run app.py --server.port=8502")
-            
-    except:
-        print("❌ System Status: CANNOT DETERMINE")
+    # Summary (uses the outcomes recorded above, no new requests)
+    if api_ok and frontend_ok:
+        print("🎉 System Status: ALL SERVICES RUNNING")
+        print("🌐 Frontend URL: http://localhost:8502")
+        print("📡 API URL: http://localhost:8000")
+        print("📚 API Docs: http://localhost:8000/docs")
+    elif api_ok:
+        print("⚠️  System Status: API ONLY (Frontend down)")
+    elif frontend_ok:
+        print("⚠️  System Status: FRONTEND ONLY (API down)")
+    else:
+        print("❌ System Status: ALL SERVICES DOWN")
+        print("\n🔧 Quick Fix:")
+        print("1. Start API: python main.py")
+        print("2. Start Frontend: streamlit run app.py --server.port=8502")
 
 if __name__ == "__main__":
     check_services()
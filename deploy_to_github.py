@@ -3,35 +3,7 @@ import subprocess
 import sys
 from pathlib import Path
 
-def run_command(command, description):
-    """Run a shell command and handle errors."""
-    print(f"🔄 {description}...")
-    try:
-        result = subprocess.run(command, shell=True, check=True, capture_output=True, text=True)
-        print(f"✅ {description} completed successfully")
-        return result.stdout
-    except subprocess.CalledProcessError as e:
-        print(f"❌ {description} failed: {e.stderr}")
-        return None
-
-def deploy_to_github():
-    """Deploy the project to GitHub."""
-    print("🚀 Starting GitHub deployment...\n")
-    
-    # Check if git is installed
-    if not run_command("git --version", "Checking Git installation"):
-        print("❌ Git is not installed. Please install Git first.")
-        return False
-    
-    # Initialize git repository if not exists
-    if not Path(".git").exists():
-        run_command("git init", "Initializing Git repository")
-    
-    # Create .gitignore if not exists
-    if not Path(".gitignore").exists():
-        print("📝 Creating .gitignore file...")
-        with open(".gitignore", "w") as f:
-            f.write("""# Python
+GITIGNORE = """# Python
 __pycache__/
 *.py[cod]
 *.so
@@ -73,14 +45,43 @@ Thumbs.db
 
 # Environment variables
 .env
-""")
+"""
+
+def run_command(command, description, capture_output=True):
+    """Run a command (argument list, no shell) and handle errors."""
+    print(f"🔄 {description}...")
+    try:
+        result = subprocess.run(command, check=True, capture_output=capture_output, text=True)
+        print(f"✅ {description} completed successfully")
+        return result.stdout if capture_output else True
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        print(f"❌ {description} failed: {getattr(e, 'stderr', None) or e}")
+        return None
+
+def deploy_to_github():
+    """Deploy the project to GitHub."""
+    print("🚀 Starting GitHub deployment...\n")
+    
+    # Check if git is installed
+    if not run_command(["git", "--version"], "Checking Git installation"):
+        print("❌ Git is not installed. Please install Git first.")
+        return False
+    
+    # Initialize git repository if not exists
+    if not Path(".git").exists():
+        run_command(["git", "init"], "Initializing Git repository")
+    
+    # Create .gitignore if not exists
+    if not Path(".gitignore").exists():
+        print("📝 Creating .gitignore file...")
+        Path(".gitignore").write_text(GITIGNORE, encoding="utf-8")
     
     # Add files to git
-    run_command("git add .", "Adding files to repository")
+    run_command(["git", "add", "."], "Adding files to repository")
     
     # Create initial commit
-    run_command('git commit -m "Initial commit: Multimodal Video Caption Enhancement System"', 
-                "Creating initial commit")
+    run_command(["git", "commit", "-m", "Initial commit: Multimodal Video Caption Enhancement System"],
+                "Creating initial commit", capture_output=False)
     
     print("\n✅ Project prepared for GitHub!")
     print("\n📋 Next steps:")
@@ -8,22 +8,31 @@ import os
 import io
 import cv2
 import numpy as np
-import whisper
+from faster_whisper import WhisperModel
 import clip
 import torch
+import httpx
+import aiofiles
+from torchvision.transforms import v2 as T
 import json
+import uuid
+import hashlib
+import asyncio
 import tempfile
+import shutil
+import threading
+import subprocess
 import logging
+from collections import Counter
+from itertools import chain
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, Callable, List, Dict, Any, Optional, Tuple
 from pathlib import Path
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks
+from fastapi import FastAPI, File, Form, Request, UploadFile, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from moviepy import VideoFileClip
-from PIL import Image
-import openai
+from fastapi.responses import JSONResponse, StreamingResponse
+from openai import AsyncOpenAI
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -48,28 +57,268 @@ app.add_middleware(
 # Global model instances (cached for performance)
 whisper_model = None
 clip_model = None
-clip_preprocess = None
+clip_transform = None
+label_text_features = None  # scene prompts followed by object prompts
+clip_visual_session = None
 device = None
 
+# Whisper expects 16 kHz mono audio
+SAMPLE_RATE = 16000
+
+# Silero VAD settings used to cut silence out before Whisper decodes
+VAD_PARAMETERS = {
+    "threshold": 0.5,
+    "min_silence_duration_ms": 500,  # presentation pauses are short; split on them
+    "speech_pad_ms": 200
+}
+
+# Process role: "all" runs the whole pipeline, "asr" / "vision" serve a single stage
+MODES = ("all", "asr", "vision")
+MODE = os.getenv("MODE", "all").strip().lower()
+if MODE not in MODES:
+    raise ValueError(f"Unsupported MODE {MODE!r}. Choose from: {', '.join(MODES)}")
+
+# Stages an "all" process hands to separate ASR / vision services instead of loading the model
+ASR_SERVICE_URL = os.getenv("ASR_SERVICE_URL")
+VISION_SERVICE_URL = os.getenv("VISION_SERVICE_URL")
+LOCAL_ASR = MODE == "asr" or (MODE == "all" and not ASR_SERVICE_URL)
+LOCAL_VISION = MODE == "vision" or (MODE == "all" and not VISION_SERVICE_URL)
+service_client = httpx.AsyncClient(timeout=300) if ASR_SERVICE_URL or VISION_SERVICE_URL else None
+
+# Image encoder backend: "torch" (eager) or "onnx" (ONNX Runtime, exported on first start)
+CLIP_BACKENDS = ("torch", "onnx")
+CLIP_BACKEND = os.getenv("CLIP_BACKEND", "torch").strip().lower()
+if CLIP_BACKEND not in CLIP_BACKENDS:
+    raise ValueError(f"Unsupported CLIP_BACKEND {CLIP_BACKEND!r}. Choose from: {', '.join(CLIP_BACKENDS)}")
+CLIP_ONNX_DIR = Path(os.getenv("CLIP_ONNX_DIR", "models/clip"))
+
+# CLIP ViT-B/32 input resolution and normalization statistics
+CLIP_INPUT_SIZE = 224
+CLIP_MEAN = (0.48145466, 0.4578275, 0.40821073)
+CLIP_STD = (0.26862954, 0.26130258, 0.27577711)
+
+# Labels CLIP classifies each frame against
+SCENE_TYPES = [
+    "indoor office", "outdoor scene", "presentation room", "meeting room",
+    "home interior", "street scene", "nature scene", "classroom",
+    "conference room", "living room"
+]
+
+COMMON_OBJECTS = [
+    "person", "people", "computer", "laptop", "phone", "table", "chair",
+    "screen", "monitor", "whiteboard", "car", "building", "tree",
+    "book", "document", "microphone", "camera"
+]
+
+# Background processing jobs, keyed by job id
+jobs: Dict[str, Dict[str, Any]] = {}
+JOB_TTL = 600  # seconds a finished job stays available
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+# Finished results keyed by upload hash and styles (newest RESULT_CACHE_SIZE kept on disk),
+# and CLIP analyses keyed by frame hash
+RESULT_CACHE_DIR = Path(tempfile.gettempdir()) / "vce_cache"
+frame_analysis_cache: Dict[str, Dict[str, Any]] = {}
+frame_cache_lock = threading.Lock()
+RESULT_CACHE_SIZE = 256
+FRAME_CACHE_SIZE = 1024
+
+# Frames whose dHashes differ in fewer bits than this reuse the previous analysis
+DHASH_DUPLICATE_BITS = 6
+
+# Uploads are copied to disk in chunks of this many bytes
+UPLOAD_CHUNK_SIZE = 1 << 20
+
 # OpenAI API key (set via environment variable)
-openai.api_key = os.getenv("OPENAI_API_KEY")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
+CAPTION_MODEL = "gpt-3.5-turbo"
+CAPTION_TOKENS_PER_STYLE = 150  # ~450 tokens for all three styles in one JSON answer
+CAPTION_SYSTEM_PROMPT = "You are an expert video caption writer."
+
+# Caption styles, generated together in one GPT request
+CAPTION_STYLES = {
+    "professional": "Create a professional, formal caption suitable for business presentations. Focus on clarity and professionalism.",
+    "creative": "Create an engaging, creative caption that tells a story. Use descriptive language and make it interesting.",
+    "accessible": "Create a simple, easy-to-understand caption using clear language suitable for all audiences."
+}
+
+def encode_prompts(prompts: List[str]) -> torch.Tensor:
+    """Encode text prompts with CLIP and L2-normalize them"""
+    with torch.no_grad():
+        text_features = clip_model.encode_text(clip.tokenize(prompts).to(device))
+    return text_features / text_features.norm(dim=-1, keepdim=True)
+
+def dhash(frame: np.ndarray) -> int:
+    """64-bit difference hash of a BGR frame, for spotting near-duplicate frames"""
+    gray = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (9, 8), interpolation=cv2.INTER_AREA)
+    return int.from_bytes(np.packbits(gray[:, 1:] > gray[:, :-1]).tobytes(), "big")
+
+def encode_images(image_input: torch.Tensor) -> torch.Tensor:
+    """Run the CLIP image encoder through ONNX Runtime when enabled, eager PyTorch otherwise"""
+    if clip_visual_session is None:
+        return clip_model.encode_image(image_input)
+    
+    if not image_input.is_cuda or clip_visual_session.get_providers()[0] != "CUDAExecutionProvider":
+        image_features = clip_visual_session.run(None, {"input": image_input.cpu().numpy()})[0]
+        return torch.from_numpy(image_features).to(device)
+    
+    # Bind the preprocessed batch and the output in device memory, so nothing crosses PCIe
+    image_input = image_input.contiguous()
+    image_features = torch.empty(
+        (image_input.shape[0], clip_model.visual.output_dim), device=image_input.device, dtype=image_input.dtype
+    )
+    element_type = np.float16 if image_input.dtype == torch.float16 else np.float32
+    device_id = image_input.device.index or 0
+    
+    binding = clip_visual_session.io_binding()
+    binding.bind_input("input", "cuda", device_id, element_type, tuple(image_input.shape), image_input.data_ptr())
+    binding.bind_output("output", "cuda", device_id, element_type, tuple(image_features.shape), image_features.data_ptr())
+    
+    # ONNX Runtime uses its own CUDA stream; the input must be ready before it starts
+    torch.cuda.current_stream().synchronize()
+    clip_visual_session.run_with_iobinding(binding)
+    return image_features
+
+def load_onnx_visual_session():
+    """Export CLIP's image encoder to ONNX once and open it with ONNX Runtime"""
+    import onnxruntime as ort
+    
+    # The export keeps the model dtype (fp16 on CUDA, fp32 on CPU)
+    dtype_name = str(clip_model.dtype).split(".")[-1]
+    onnx_path = CLIP_ONNX_DIR / f"clip_vit_b32_visual_{dtype_name}.onnx"
+    if not onnx_path.exists():
+        logger.info(f"Exporting CLIP image encoder to {onnx_path}...")
+        onnx_path.parent.mkdir(parents=True, exist_ok=True)
+        dummy = torch.randn(1, 3, CLIP_INPUT_SIZE, CLIP_INPUT_SIZE, device=device, dtype=clip_model.dtype)
+        
+        # Export under a temporary name and swap it in, so an interrupted export
+        # never leaves a truncated model that later starts would trust
+        partial_path = onnx_path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        try:
+            torch.onnx.export(
+                clip_model.visual, dummy, str(partial_path),
+                input_names=["input"], output_names=["output"],
+                dynamic_axes={"input": {0: "batch"}, "output": {0: "batch"}},
+                opset_version=17
+            )
+            os.replace(partial_path, onnx_path)
+        finally:
+            partial_path.unlink(missing_ok=True)
+    
+    sess_options = ort.SessionOptions()
+    sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    providers = ["CUDAExecutionProvider", "CPUExecutionProvider"] if device == "cuda" else ["CPUExecutionProvider"]
+    return ort.InferenceSession(str(onnx_path), sess_options, providers=providers)
+
+def store_cached_result(cache_file: Path, result: Dict[str, Any]):
+    """Atomically write a result to the disk cache, evicting the oldest past RESULT_CACHE_SIZE"""
+    try:
+        RESULT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        
+        # Write beside the target and swap it in, so readers never see a partial file
+        partial_file = cache_file.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        partial_file.write_text(json.dumps(result), encoding="utf-8")
+        os.replace(partial_file, cache_file)
+        
+        cached_files = sorted(RESULT_CACHE_DIR.glob("*.json"), key=lambda path: path.stat().st_mtime)
+        for stale_file in cached_files[:-RESULT_CACHE_SIZE]:
+            stale_file.unlink(missing_ok=True)
+    except OSError as e:
+        # Another request may be evicting at the same time; caching is best effort
+        logger.warning(f"Could not update result cache: {str(e)}")
+
+def load_cached_result(cache_file: Path) -> Optional[Dict[str, Any]]:
+    """Read a cached result, or None on a miss (including entries evicted or corrupted meanwhile)"""
+    try:
+        result = json.loads(cache_file.read_text(encoding="utf-8"))
+        cache_file.touch()  # recently served entries survive eviction
+        return result
+    except (OSError, ValueError):
+        return None
+
+def cache_frame_analysis(frame_key: str, analysis: Dict[str, Any]):
+    """Remember a frame's CLIP analysis, evicting the oldest entries past FRAME_CACHE_SIZE"""
+    # Several analysis worker threads may insert and evict at once
+    with frame_cache_lock:
+        frame_analysis_cache[frame_key] = analysis
+        while len(frame_analysis_cache) > FRAME_CACHE_SIZE:
+            frame_analysis_cache.pop(next(iter(frame_analysis_cache)), None)
+
+def initialize_whisper():
+    """Load the Whisper model (CTranslate2 backend with int8 weights)"""
+    global whisper_model
+    
+    logger.info("Loading Whisper model...")
+    compute_type = "int8_float16" if device == "cuda" else "int8"
+    whisper_model = WhisperModel("base", device=device, compute_type=compute_type)
+
+def initialize_clip():
+    """Load CLIP, its device-side preprocessing and the encoded label prompts"""
+    global clip_model, clip_transform, clip_visual_session, label_text_features
+    
+    logger.info("Loading CLIP model...")
+    # On CUDA clip.load keeps the fp16 weights; on CPU it upcasts to fp32
+    clip_model, _ = clip.load("ViT-B/32", device=device)
+    logger.info(f"CLIP running in {clip_model.dtype}")
+    
+    # CLIP's PIL preprocessing, rebuilt to run batched on uint8 tensors on the device
+    clip_transform = T.Compose([
+        T.Resize(CLIP_INPUT_SIZE, interpolation=T.InterpolationMode.BICUBIC, antialias=True),
+        T.CenterCrop(CLIP_INPUT_SIZE),
+        T.ToDtype(clip_model.dtype, scale=True),
+        T.Normalize(mean=CLIP_MEAN, std=CLIP_STD)
+    ])
+    
+    if CLIP_BACKEND == "onnx":
+        try:
+            clip_visual_session = load_onnx_visual_session()
+            logger.info(f"CLIP image encoder running on ONNX Runtime ({clip_visual_session.get_providers()[0]})")
+        except Exception as e:
+            logger.warning(f"ONNX Runtime unavailable, using PyTorch image encoder: {str(e)}")
+    
+    if device == "cuda" and clip_visual_session is None:
+        compile_clip_visual()
+    
+    # Label prompts never change, so encode them once
+    label_text_features = encode_prompts(
+        [f"a photo of {scene}" for scene in SCENE_TYPES] +
+        [f"a photo of a {obj}" for obj in COMMON_OBJECTS]
+    )
+
+def compile_clip_visual():
+    """Compile CLIP's image encoder with TorchInductor, keeping eager mode if compilation fails"""
+    global clip_model
+    
+    eager_visual = clip_model.visual
+    try:
+        logger.info("Compiling CLIP image encoder...")
+        # Default mode: CUDA graphs would be re-captured for every worker thread that runs CLIP
+        clip_model.visual = torch.compile(eager_visual, fullgraph=True)
+        
+        # Compile every batch size a video can produce now, not on the first requests
+        with torch.no_grad():
+            for batch_size in range(1, video_processor.num_frames + 1):
+                clip_model.visual(torch.zeros(
+                    batch_size, 3, CLIP_INPUT_SIZE, CLIP_INPUT_SIZE, device=device, dtype=clip_model.dtype
+                ))
+    except Exception as e:
+        logger.warning(f"torch.compile failed, using eager CLIP image encoder: {str(e)}")
+        clip_model.visual = eager_visual
 
 def initialize_models():
-    """Initialize and cache models for better performance"""
-    global whisper_model, clip_model, clip_preprocess, device
+    """Initialize and cache the models this process serves"""
+    global device
     
     try:
         # Set device
         device = "cuda" if torch.cuda.is_available() else "cpu"
-        logger.info(f"Using device: {device}")
+        logger.info(f"Using device: {device} (mode: {MODE})")
         
-        # Load Whisper model
-        logger.info("Loading Whisper model...")
-        whisper_model = whisper.load_model("base")
-        
-        # Load CLIP model
-        logger.info("Loading CLIP model...")
-        clip_model, clip_preprocess = clip.load("ViT-B/32", device=device)
+        if LOCAL_ASR:
+            initialize_whisper()
+        if LOCAL_VISION:
+            initialize_clip()
         
         logger.info("All models loaded successfully!")
         
@@ -79,7 +328,8 @@ def initialize_models():
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize models on startup"""
+    """Create the working directory and initialize models on startup"""
+    video_processor.workdir = Path(tempfile.mkdtemp(prefix="vce_"))
     initialize_models()
 
 class VideoProcessor:
@@ -89,88 +339,244 @@ class VideoProcessor:
         self.max_file_size = 100 * 1024 * 1024  # 100MB
         self.max_duration = 120  # 2 minutes
         self.num_frames = 5
+        
+        # One working directory per worker, created at startup; uploads get per-request names inside it
+        self.workdir: Optional[Path] = None
+        
+        # Reused page-locked staging buffer and copy stream for frame uploads on CUDA
+        self._pinned: Optional[torch.Tensor] = None
+        self._copy_stream = None
+        self._pinned_lock = threading.Lock()
     
-    async def process_video(self, file: UploadFile) -> Dict[str, Any]:
+    async def process_video(self, file: UploadFile, styles: List[str]) -> Dict[str, Any]:
         """Main processing pipeline"""
         start_time = datetime.now()
         
         try:
-            # Validate file
-            await self._validate_file(file)
-            
-            # Save uploaded file temporarily
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_file:
-                content = await file.read()
-                temp_file.write(content)
-                temp_path = temp_file.name
+            # Validate and save uploaded file temporarily
+            temp_path, content_hash = await self.save_upload(file)
             
-            try:
-                # Load video
-                video_clip = VideoFileClip(temp_path)
-                
-                # Get video info
-                video_info = {
-                    "duration": video_clip.duration,
-                    "format": "mp4",
-                    "fps": video_clip.fps,
-                    "size": [video_clip.w, video_clip.h]
-                }
-                
-                # Validate duration
-                if video_info["duration"] > self.max_duration:
-                    raise HTTPException(
-                        status_code=400, 
-                        detail=f"Video too long. Max duration: {self.max_duration}s"
-                    )
-                
-                # Extract audio and transcribe
-                transcript_result = await self._extract_and_transcribe(video_clip)
-                
-                # Extract and analyze frames
-                visual_analysis = await self._extract_and_analyze_frames(video_clip)
-                
-                # Generate enhanced captions
-                enhanced_captions = await self._generate_enhanced_captions(
-                    transcript_result, visual_analysis
-                )
-                
-                # Calculate processing time
-                processing_time = (datetime.now() - start_time).total_seconds()
-                
-                result = {
-                    "video_info": video_info,
-                    "transcript": transcript_result,
-                    "visual_analysis": visual_analysis,
-                    "enhanced_captions": enhanced_captions,
-                    "processing_time": processing_time,
-                    "timestamp": datetime.now().isoformat()
-                }
-                
-                logger.info(f"Video processed successfully in {processing_time:.2f}s")
-                return result
-                
-            finally:
-                # Cleanup
-                video_clip.close()
-                os.unlink(temp_path)
+            return await self.process_saved_video(temp_path, styles, start_time, content_hash=content_hash)
                 
+        except HTTPException:
+            # Validation errors keep their 4xx status
+            raise
         except Exception as e:
             logger.error(f"Error processing video: {str(e)}")
             raise HTTPException(status_code=500, detail=str(e))
     
-    async def _validate_file(self, file: UploadFile):
-        """Validate uploaded file"""
-        # Check file size
-        file.file.seek(0, 2)  # Seek to end
-        file_size = file.file.tell()
-        file.file.seek(0)  # Reset
+    async def save_upload(self, file: UploadFile) -> Tuple[str, str]:
+        """Validate the uploaded video, stream it into the working directory and return its path and SHA-256"""
+        self._validate_file(file)
         
-        if file_size > self.max_file_size:
-            raise HTTPException(
-                status_code=400,
-                detail=f"File too large. Max size: {self.max_file_size / (1024*1024):.0f}MB"
+        async def read_chunks():
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                yield chunk
+        
+        return await self.save_stream(read_chunks())
+    
+    async def save_stream(self, chunks: AsyncIterator[bytes]) -> Tuple[str, str]:
+        """Write a stream of video bytes into the working directory and return its path and SHA-256"""
+        temp_path = str(self.workdir / f"{uuid.uuid4().hex}.mp4")
+        digest = hashlib.sha256()
+        file_size = 0
+        try:
+            with open(temp_path, "wb") as temp_file:
+                # Copy chunk by chunk, enforcing the size limit as we go
+                async for chunk in chunks:
+                    file_size += len(chunk)
+                    if file_size > self.max_file_size:
+                        raise HTTPException(
+                            status_code=400,
+                            detail=f"File too large. Max size: {self.max_file_size / (1024*1024):.0f}MB"
+                        )
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+        except BaseException:
+            # Oversized upload, client disconnect or cancellation: don't leave the partial file behind
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        
+        return temp_path, digest.hexdigest()
+    
+    async def process_saved_video(self, temp_path: str, styles: List[str], start_time: datetime,
+                                  progress: Optional[Callable[[str, float], None]] = None,
+                                  content_hash: Optional[str] = None) -> Dict[str, Any]:
+        """Run the pipeline on a saved upload, reporting each stage, and delete the file afterwards"""
+        report = progress or (lambda stage, fraction: None)
+        
+        try:
+            # Identical upload with the same styles: reuse the stored result
+            cache_file = self._result_cache_file(content_hash, styles) if content_hash else None
+            result = load_cached_result(cache_file) if cache_file else None
+            if result is not None:
+                result["processing_time"] = (datetime.now() - start_time).total_seconds()
+                result["timestamp"] = datetime.now().isoformat()
+                logger.info(f"Served cached result for {content_hash[:12]}")
+                return result
+            
+            # Load video
+            report("loading", 0.05)
+            video_info = await self._load_video_info(temp_path)
+            
+            # Transcribe audio and analyze frames concurrently, in worker threads or
+            # on the dedicated ASR / vision services
+            report("analyzing", 0.1)
+            analysis = asyncio.gather(
+                self._transcribe(temp_path),
+                self._analyze_frames(temp_path)
+            )
+            try:
+                transcript_result, visual_analysis = await asyncio.shield(analysis)
+            except asyncio.CancelledError:
+                # Worker threads cannot be interrupted; let them return before the
+                # video they are reading is deleted and the job reports cancelled
+                logger.info("Cancelled; waiting for analysis workers to finish")
+                while not analysis.done():
+                    try:
+                        await asyncio.wait({analysis})
+                    except asyncio.CancelledError:
+                        continue
+                raise
+            
+            # Generate enhanced captions
+            report("generating_captions", 0.8)
+            enhanced_captions, captions_generated = await self._generate_enhanced_captions(
+                transcript_result, visual_analysis, styles
             )
+            
+            # Calculate processing time
+            processing_time = (datetime.now() - start_time).total_seconds()
+            
+            result = {
+                "video_info": video_info,
+                "transcript": transcript_result,
+                "visual_analysis": visual_analysis,
+                "enhanced_captions": enhanced_captions,
+                "processing_time": processing_time,
+                "timestamp": datetime.now().isoformat()
+            }
+            
+            # Only complete results are cached; a degraded one would be served for this upload forever
+            degraded = "error" in transcript_result or "error" in visual_analysis or not captions_generated
+            if cache_file and not degraded:
+                store_cached_result(cache_file, result)
+            
+            logger.info(f"Video processed successfully in {processing_time:.2f}s")
+            return result
+            
+        finally:
+            # Cleanup
+            os.unlink(temp_path)
+    
+    async def _transcribe(self, video_path: str) -> Dict[str, Any]:
+        """Transcribe in a worker thread, or on the ASR service when this process does not run Whisper"""
+        if LOCAL_ASR:
+            # Whisper releases the GIL inside its kernels, so this overlaps with CLIP
+            return await asyncio.to_thread(self._extract_and_transcribe, video_path)
+        try:
+            return await self._call_service(ASR_SERVICE_URL, "/internal/transcribe", video_path)
+        except Exception as e:
+            logger.error(f"Error calling ASR service: {str(e)}")
+            return {
+                "text": "",
+                "confidence": 0.0,
+                "segments": [],
+                "language": "unknown",
+                "error": str(e)
+            }
+    
+    async def _analyze_frames(self, video_path: str) -> Dict[str, Any]:
+        """Analyze frames in a worker thread, or on the vision service when this process does not run CLIP"""
+        if LOCAL_VISION:
+            return await asyncio.to_thread(self._extract_and_analyze_frames, video_path)
+        try:
+            return await self._call_service(VISION_SERVICE_URL, "/internal/analyze-frames", video_path)
+        except Exception as e:
+            logger.error(f"Error calling vision service: {str(e)}")
+            return {
+                "scene_type": "unknown",
+                "objects": [],
+                "description": "Could not analyze video frames",
+                "error": str(e)
+            }
+    
+    async def _call_service(self, base_url: Optional[str], path: str, video_path: str) -> Dict[str, Any]:
+        """Send the saved video to a stage service and return its JSON result"""
+        if not base_url:
+            raise RuntimeError(f"No service configured for {path} in {MODE} mode")
+        
+        # Stream the raw video with async reads so the event loop never blocks on disk
+        async def read_chunks():
+            async with aiofiles.open(video_path, "rb") as video_file:
+                while chunk := await video_file.read(UPLOAD_CHUNK_SIZE):
+                    yield chunk
+        
+        response = await service_client.post(
+            f"{base_url.rstrip('/')}{path}",
+            content=read_chunks(),
+            headers={"Content-Type": "video/mp4"}
+        )
+        response.raise_for_status()
+        return response.json()
+    
+    def _result_cache_file(self, content_hash: str, styles: List[str]) -> Path:
+        """Location of the cached result for an upload hash and style selection"""
+        return RESULT_CACHE_DIR / f"{content_hash}-{'_'.join(styles)}.json"
+    
+    async def _load_video_info(self, video_path: str) -> Dict[str, Any]:
+        """Read the video's metadata off the event loop and enforce max_duration"""
+        # The OpenCV header read and the ffprobe fallback both block
+        video_info = await asyncio.to_thread(self._read_video_info, video_path)
         
+        # Validate duration
+        if video_info["duration"] > self.max_duration:
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Video too long. Max duration: {self.max_duration}s"
+            )
+        return video_info
+    
+    def _read_video_info(self, video_path: str) -> Dict[str, Any]:
+        """Read duration, fps and frame size from the container header"""
+        capture = cv2.VideoCapture(video_path)
+        try:
+            if not capture.isOpened():
+                raise ValueError("Could not open video file")
+            
+            fps = capture.get(cv2.CAP_PROP_FPS)
+            frame_count = capture.get(cv2.CAP_PROP_FRAME_COUNT)
+            
+            # Some containers report no fps or frame count; ask ffprobe rather than
+            # letting a zero duration slip past the max_duration check
+            duration = frame_count / fps if fps > 0 and frame_count > 0 else self._probe_duration(video_path)
+            if not duration:
+                raise HTTPException(status_code=400, detail="Could not read video duration")
+            
+            return {
+                "duration": duration,
+                "format": "mp4",
+                "fps": fps,
+                "size": [int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)), int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))]
+            }
+        finally:
+            capture.release()
+    
+    def _probe_duration(self, video_path: str) -> Optional[float]:
+        """Container duration in seconds according to ffprobe, or None if it cannot tell"""
+        command = [
+            "ffprobe", "-v", "error", "-show_entries", "format=duration",
+            "-of", "default=noprint_wrappers=1:nokey=1", video_path
+        ]
+        result = subprocess.run(command, capture_output=True, text=True)
+        try:
+            return float(result.stdout.strip())
+        except ValueError:
+            return None
+    
+    def _validate_file(self, file: UploadFile):
+        """Validate uploaded file; the size limit is enforced while saving it"""
         # Check file extension
         if not file.filename.lower().endswith(('.mp4', '.mov', '.avi')):
             raise HTTPException(
@@ -178,12 +584,12 @@ class VideoProcessor:
                 detail="Unsupported file format. Please upload MP4, MOV, or AVI files."
             )
     
-    async def _extract_and_transcribe(self, video_clip) -> Dict[str, Any]:
+    def _extract_and_transcribe(self, video_path: str) -> Dict[str, Any]:
         """Extract audio and perform speech recognition"""
         try:
             # Extract audio
             logger.info("Extracting audio...")
-            audio = video_clip.audio
+            audio = self._load_audio(video_path)
             
             if audio is None:
                 return {
@@ -193,35 +599,35 @@ class VideoProcessor:
                     "language": "unknown"
                 }
             
-            # Save audio temporarily
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_audio:
-                audio.write_audiofile(temp_audio.name, verbose=False, logger=None)
-                audio_path = temp_audio.name
+            # Transcribe with Whisper; VAD splices out silence and segment times are
+            # mapped back onto the original timeline. Segments are decoded lazily,
+            # so consume them here
+            logger.info("Transcribing audio...")
+            segments_iter, info = whisper_model.transcribe(
+                audio, beam_size=1, vad_filter=True, vad_parameters=VAD_PARAMETERS
+            )
+            whisper_segments = list(segments_iter)
             
-            try:
-                # Transcribe with Whisper
-                logger.info("Transcribing audio...")
-                result = whisper_model.transcribe(audio_path)
-                
-                # Extract segments with confidence scores
-                segments = []
-                for segment in result.get("segments", []):
-                    segments.append({
-                        "start": segment["start"],
-                        "end": segment["end"],
-                        "text": segment["text"].strip(),
-                        "confidence": getattr(segment, 'avg_logprob', 0.0)
-                    })
-                
-                return {
-                    "text": result["text"].strip(),
-                    "confidence": np.mean([s["confidence"] for s in segments]) if segments else 0.0,
-                    "segments": segments,
-                    "language": result.get("language", "unknown")
-                }
-                
-            finally:
-                os.unlink(audio_path)
+            speech_duration = getattr(info, "duration_after_vad", None)
+            if speech_duration is not None:
+                logger.info(f"VAD kept {speech_duration:.1f}s of {info.duration:.1f}s of audio")
+            
+            # Extract segments with confidence scores (mean token probability)
+            segments = []
+            for segment in whisper_segments:
+                segments.append({
+                    "start": segment.start,
+                    "end": segment.end,
+                    "text": segment.text.strip(),
+                    "confidence": float(np.exp(segment.avg_logprob))
+                })
+            
+            return {
+                "text": "".join(segment.text for segment in whisper_segments).strip(),
+                "confidence": float(np.mean([s["confidence"] for s in segments])) if segments else 0.0,
+                "segments": segments,
+                "language": info.language or "unknown"
+            }
                 
         except Exception as e:
             logger.error(f"Error in audio transcription: {str(e)}")
@@ -233,49 +639,77 @@ class VideoProcessor:
                 "error": str(e)
             }
     
-    async def _extract_and_analyze_frames(self, video_clip) -> Dict[str, Any]:
+    def _load_audio(self, video_path: str) -> Optional[np.ndarray]:
+        """Decode the audio track to Whisper's 16 kHz mono float32, or None if there is no audio"""
+        command = [
+            "ffmpeg", "-nostdin", "-i", video_path,
+            "-map", "0:a:0?", "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE),
+            "-f", "s16le", "-loglevel", "error", "-"
+        ]
+        result = subprocess.run(command, capture_output=True)
+        
+        if result.returncode != 0:
+            stderr = result.stderr.decode(errors="ignore")
+            # The optional audio map leaves no output stream when the video is silent
+            if "does not contain any stream" in stderr:
+                return None
+            raise RuntimeError(f"ffmpeg failed to extract audio: {stderr.strip()}")
+        
+        if not result.stdout:
+            return None
+        
+        # Raw PCM straight from the pipe, no intermediate WAV file
+        return np.frombuffer(result.stdout, np.int16).astype(np.float32) / 32768.0
+    
+    def _extract_and_analyze_frames(self, video_path: str) -> Dict[str, Any]:
         """Extract key frames and analyze with CLIP"""
         try:
             logger.info("Extracting and analyzing frames...")
             
-            duration = video_clip.duration
-            frame_times = np.linspace(0, duration * 0.9, self.num_frames)  # Avoid last 10%
-            
             frames = []
             frame_analyses = []
             
-            for i, t in enumerate(frame_times):
-                try:
-                    # Extract frame
-                    frame = video_clip.get_frame(t)
-                    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-                    frames.append(frame_rgb)
-                    
-                    # Analyze frame with CLIP
-                    analysis = await self._analyze_frame_with_clip(frame)
-                    frame_analyses.append(analysis)
-                    
-                except Exception as e:
-                    logger.warning(f"Error processing frame {i}: {str(e)}")
-                    continue
+            # Seek straight to each sampled frame instead of decoding through MoviePy
+            capture = cv2.VideoCapture(video_path)
+            try:
+                total_frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+                frame_indices = np.linspace(0, int(total_frames * 0.9), self.num_frames, dtype=int)  # Avoid last 10%
+                
+                for i, frame_index in enumerate(frame_indices):
+                    try:
+                        # Extract frame
+                        capture.set(cv2.CAP_PROP_POS_FRAMES, int(frame_index))
+                        ok, frame = capture.read()
+                        if not ok:
+                            raise ValueError(f"could not decode frame {frame_index}")
+                        frames.append(frame)  # BGR; channels are flipped on the device
+                        
+                    except Exception as e:
+                        logger.warning(f"Error processing frame {i}: {str(e)}")
+                        continue
+            finally:
+                capture.release()
+            
+            # Analyze all frames with CLIP in one batch
+            if frames:
+                frame_analyses = self._analyze_frames_with_clip(frames)
             
             # Aggregate results
             scene_types = [analysis.get("scene_type", "unknown") for analysis in frame_analyses]
-            all_objects = []
-            for analysis in frame_analyses:
-                all_objects.extend(analysis.get("objects", []))
             
             # Most common scene type
-            scene_type = max(set(scene_types), key=scene_types.count) if scene_types else "unknown"
+            scene_type = Counter(scene_types).most_common(1)[0][0] if scene_types else "unknown"
             
-            # Unique objects
-            unique_objects = list(set(all_objects))
+            # Unique objects, in the order they were first seen
+            unique_objects = list(dict.fromkeys(
+                chain.from_iterable(analysis.get("objects", []) for analysis in frame_analyses)
+            ))
             
             # Generate overall description
             descriptions = [analysis.get("description", "") for analysis in frame_analyses]
             overall_description = self._generate_scene_description(scene_type, unique_objects, descriptions)
             
-            return {
+            visual_analysis = {
                 "scene_type": scene_type,
                 "objects": unique_objects[:10],  # Top 10 objects
                 "description": overall_description,
@@ -283,6 +717,15 @@ class VideoProcessor:
                 "individual_frames": frame_analyses
             }
             
+            # Surface placeholder frames so the result is treated as degraded
+            frame_errors = [analysis["error"] for analysis in frame_analyses if "error" in analysis]
+            if frame_errors:
+                visual_analysis["error"] = frame_errors[0]
+            elif not frames:
+                visual_analysis["error"] = "No frames could be decoded"
+            
+            return visual_analysis
+            
         except Exception as e:
             logger.error(f"Error in visual analysis: {str(e)}")
             return {
@@ -292,70 +735,115 @@ class VideoProcessor:
                 "error": str(e)
             }
     
-    async def _analyze_frame_with_clip(self, frame) -> Dict[str, Any]:
-        """Analyze single frame with CLIP model"""
-        try:
-            # Convert to PIL Image
-            image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-            
-            # Preprocess image
-            image_input = clip_preprocess(image).unsqueeze(0).to(device)
-            
-            # Define scene types and objects to classify
-            scene_types = [
-                "indoor office", "outdoor scene", "presentation room", "meeting room",
-                "home interior", "street scene", "nature scene", "classroom",
-                "conference room", "living room"
-            ]
-            
-            common_objects = [
-                "person", "people", "computer", "laptop", "phone", "table", "chair",
-                "screen", "monitor", "whiteboard", "car", "building", "tree",
-                "book", "document", "microphone", "camera"
-            ]
-            
-            # Encode text descriptions
-            scene_text = clip.tokenize([f"a photo of {scene}" for scene in scene_types]).to(device)
-            object_text = clip.tokenize([f"a photo of a {obj}" for obj in common_objects]).to(device)
-            
-            # Get predictions
-            with torch.no_grad():
-                # Scene classification
-                scene_logits = clip_model(image_input, scene_text)[0]
-                scene_probs = scene_logits.softmax(dim=-1).cpu().numpy()[0]
+    def _analyze_frames_with_clip(self, frames: List[np.ndarray]) -> List[Dict[str, Any]]:
+        """Analyze a batch of frames with a single CLIP forward pass, reusing cached analyses of identical frames"""
+        frame_keys = [hashlib.blake2b(frame.tobytes(), digest_size=16).hexdigest() for frame in frames]
+        analyses = [frame_analysis_cache.get(key) for key in frame_keys]
+        
+        # Near-identical consecutive frames (static slides, talking heads) share one analysis
+        duplicate_of = {}
+        previous = None  # (index, dHash) of the last distinct frame
+        for i, frame in enumerate(frames):
+            frame_hash = dhash(frame)
+            if previous and bin(frame_hash ^ previous[1]).count("1") < DHASH_DUPLICATE_BITS:
+                duplicate_of[i] = previous[0]
+            else:
+                previous = (i, frame_hash)
+        
+        pending = [i for i, analysis in enumerate(analyses) if analysis is None and i not in duplicate_of]
+        clip_error = None
+        
+        if pending:
+            try:
+                # Upload the uncached frames as one uint8 RGB NCHW batch and
+                # resize/normalize them on the device
+                batch = self._upload_frames([frames[i] for i in pending])
+                image_input = clip_transform(batch)
                 
-                # Object detection
-                object_logits = clip_model(image_input, object_text)[0]
-                object_probs = object_logits.softmax(dim=-1).cpu().numpy()[0]
-            
-            # Get top predictions
-            scene_idx = np.argmax(scene_probs)
-            scene_type = scene_types[scene_idx].replace(" ", "_")
-            
-            # Get objects above threshold
-            threshold = 0.1
-            detected_objects = [
-                common_objects[i] for i, prob in enumerate(object_probs) 
-                if prob > threshold
-            ]
-            
-            # Generate description
-            description = f"Scene shows {scene_type.replace('_', ' ')} with {', '.join(detected_objects[:3])}"
-            
-            return {
-                "scene_type": scene_type,
-                "scene_confidence": float(scene_probs[scene_idx]),
-                "objects": detected_objects,
-                "description": description
-            }
-            
-        except Exception as e:
-            logger.error(f"Error analyzing frame: {str(e)}")
-            return {
+                # Get predictions
+                with torch.no_grad():
+                    image_features = encode_images(image_input)
+                    image_features = image_features / image_features.norm(dim=-1, keepdim=True)
+                    
+                    # Same scaled cosine similarity CLIP's forward() produces
+                    logit_scale = clip_model.logit_scale.exp()
+                    
+                    # Score scene and object prompts in one matmul, then softmax
+                    # each label set on its own
+                    logits = (logit_scale * image_features @ label_text_features.T).float()
+                    scene_probs = logits[:, :len(SCENE_TYPES)].softmax(dim=-1).cpu().numpy()
+                    object_probs = logits[:, len(SCENE_TYPES):].softmax(dim=-1).cpu().numpy()
+                
+                for i, frame_scene_probs, frame_object_probs in zip(pending, scene_probs, object_probs):
+                    analyses[i] = self._summarize_clip_predictions(frame_scene_probs, frame_object_probs)
+                    cache_frame_analysis(frame_keys[i], analyses[i])
+                
+            except Exception as e:
+                logger.error(f"Error analyzing frames: {str(e)}")
+                clip_error = str(e)
+        
+        for i, original in duplicate_of.items():
+            if analyses[i] is None:
+                analyses[i] = analyses[original]
+        
+        return [
+            dict(analysis) if analysis else {
                 "scene_type": "unknown",
                 "objects": [],
-                "description": "Could not analyze frame"
+                "description": "Could not analyze frame",
+                "error": clip_error or "Could not analyze frame"
             }
+            for analysis in analyses
+        ]
+    
+    def _upload_frames(self, frames: List[np.ndarray]) -> torch.Tensor:
+        """Move OpenCV's HWC uint8 BGR frames to the device as one RGB NCHW batch"""
+        if device != "cuda":
+            return torch.from_numpy(np.stack(frames)).permute(0, 3, 1, 2).flip(1)
+        
+        shape = (len(frames),) + frames[0].shape
+        size = int(np.prod(shape))
+        with self._pinned_lock:
+            # Grow the pinned buffer only when a larger batch arrives
+            if self._pinned is None or self._pinned.numel() < size:
+                self._pinned = torch.empty(size, dtype=torch.uint8, pin_memory=True)
+            if self._copy_stream is None:
+                self._copy_stream = torch.cuda.Stream()
+            
+            staging = self._pinned[:size].view(shape)
+            for i, frame in enumerate(frames):
+                staging[i].copy_(torch.from_numpy(frame))
+            
+            # Asynchronous DMA on the side stream; wait for it before the buffer is reused
+            with torch.cuda.stream(self._copy_stream):
+                batch = staging.to(device, non_blocking=True)
+            self._copy_stream.synchronize()
+        
+        # BGR -> RGB as part of the layout change, instead of a cvtColor per frame on the CPU
+        return batch.permute(0, 3, 1, 2).flip(1)
+    
+    def _summarize_clip_predictions(self, scene_probs: np.ndarray, object_probs: np.ndarray) -> Dict[str, Any]:
+        """Turn one frame's CLIP probabilities into a frame analysis"""
+        # Get top predictions
+        scene_idx = np.argmax(scene_probs)
+        scene_type = SCENE_TYPES[scene_idx].replace(" ", "_")
+        
+        # Get objects above threshold
+        threshold = 0.1
+        detected_objects = [
+            COMMON_OBJECTS[i] for i, prob in enumerate(object_probs) 
+            if prob > threshold
+        ]
+        
+        # Generate description
+        description = f"Scene shows {scene_type.replace('_', ' ')} with {', '.join(detected_objects[:3])}"
+        
+        return {
+            "scene_type": scene_type,
+            "scene_confidence": float(scene_probs[scene_idx]),
+            "objects": detected_objects,
+            "description": description
+        }
     
     def _generate_scene_description(self, scene_type: str, objects: List[str], descriptions: List[str]) -> str:
         """Generate overall scene description"""
@@ -368,12 +856,13 @@ class VideoProcessor:
         except:
             return "Video contains various scenes and objects."
     
-    async def _generate_enhanced_captions(self, transcript: Dict, visual_analysis: Dict) -> Dict[str, str]:
-        """Generate enhanced captions using OpenAI GPT"""
+    async def _generate_enhanced_captions(self, transcript: Dict, visual_analysis: Dict,
+                                          styles: List[str]) -> Tuple[Dict[str, str], bool]:
+        """Generate enhanced captions using a single OpenAI GPT request; the flag is False if any caption is a fallback"""
         try:
-            if not openai.api_key:
+            if openai_client is None:
                 logger.warning("OpenAI API key not set. Using fallback captions.")
-                return self._generate_fallback_captions(transcript, visual_analysis)
+                return self._generate_fallback_captions(transcript, visual_analysis, styles), False
             
             # Prepare context
             text = transcript.get("text", "No speech detected")
@@ -386,57 +875,101 @@ class VideoProcessor:
             Objects visible: {objects}
             """
             
-            # Generate different caption styles
-            styles = {
-                "professional": "Create a professional, formal caption suitable for business presentations. Focus on clarity and professionalism.",
-                "creative": "Create an engaging, creative caption that tells a story. Use descriptive language and make it interesting.",
-                "accessible": "Create a simple, easy-to-understand caption using clear language suitable for all audiences."
-            }
+            # Ask for every requested style in one completion
+            style_instructions = "\n".join(
+                f"- {style_name}: {CAPTION_STYLES[style_name]}" for style_name in styles
+            )
+            
+            prompt = f"""
+            Write one caption (maximum 100 words) for each of these styles:
+            {style_instructions}
+            
+            Context: {context}
+            
+            Return only a JSON object whose keys are {", ".join(styles)} and whose values are the captions.
+            """
+            
+            response = await openai_client.chat.completions.create(
+                model=CAPTION_MODEL,
+                messages=[
+                    {"role": "system", "content": CAPTION_SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                response_format={"type": "json_object"},
+                max_tokens=CAPTION_TOKENS_PER_STYLE * len(styles),
+                temperature=0.7
+            )
+            
+            try:
+                generated = json.loads(response.choices[0].message.content)
+            except (json.JSONDecodeError, TypeError) as e:
+                logger.error(f"Could not parse batched captions: {str(e)}")
+                generated = {}
             
             captions = {}
+            missing = []
+            for style_name in styles:
+                caption = generated.get(style_name) if isinstance(generated, dict) else None
+                if isinstance(caption, str) and caption.strip():
+                    captions[style_name] = caption.strip()
+                else:
+                    logger.error(f"No {style_name} caption in batched response")
+                    missing.append(style_name)
             
-            for style_name, style_prompt in styles.items():
-                try:
-                    prompt = f"""
-                    {style_prompt}
-                    
-                    Context: {context}
-                    
-                    Generate a {style_name} caption (maximum 200 words):
-                    """
-                    
-                    response = openai.ChatCompletion.create(
-                        model="gpt-3.5-turbo",
-                        messages=[
-                            {"role": "system", "content": "You are an expert video caption writer."},
-                            {"role": "user", "content": prompt}
-                        ],
-                        max_tokens=200,
-                        temperature=0.7
-                    )
-                    
-                    captions[style_name] = response.choices[0].message.content.strip()
-                    
-                except Exception as e:
-                    logger.error(f"Error generating {style_name} caption: {str(e)}")
-                    captions[style_name] = self._generate_fallback_caption(transcript, visual_analysis, style_name)
+            # Re-request any styles the batched answer dropped, concurrently
+            all_generated = True
+            if missing:
+                retries = await asyncio.gather(
+                    *(self._request_caption(style_name, context) for style_name in missing),
+                    return_exceptions=True
+                )
+                for style_name, caption in zip(missing, retries):
+                    if isinstance(caption, str) and caption:
+                        captions[style_name] = caption
+                    else:
+                        logger.error(f"Error generating {style_name} caption: {caption}")
+                        captions[style_name] = self._generate_fallback_caption(transcript, visual_analysis, style_name)
+                        all_generated = False
             
-            return captions
+            return {style_name: captions[style_name] for style_name in styles}, all_generated
             
         except Exception as e:
             logger.error(f"Error in caption generation: {str(e)}")
-            return self._generate_fallback_captions(transcript, visual_analysis)
+            return self._generate_fallback_captions(transcript, visual_analysis, styles), False
+    
+    async def _request_caption(self, style_name: str, context: str) -> str:
+        """Ask GPT for a single caption style"""
+        prompt = f"""
+        {CAPTION_STYLES[style_name]} Keep it under 200 words.
+        
+        Context: {context}
+        
+        Return only the caption.
+        """
+        
+        response = await openai_client.chat.completions.create(
+            model=CAPTION_MODEL,
+            messages=[
+                {"role": "system", "content": CAPTION_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=200,
+            temperature=0.7
+        )
+        return (response.choices[0].message.content or "").strip()
     
-    def _generate_fallback_captions(self, transcript: Dict, visual_analysis: Dict) -> Dict[str, str]:
+    def _generate_fallback_captions(self, transcript: Dict, visual_analysis: Dict,
+                                    styles: List[str]) -> Dict[str, str]:
         """Generate fallback captions when OpenAI is not available"""
         text = transcript.get("text", "No speech detected")
         scene = visual_analysis.get("scene_type", "unknown").replace("_", " ")
         
-        return {
+        captions = {
             "professional": f"This video presents content in a {scene} setting. {text}",
             "creative": f"Welcome to this engaging presentation taking place in a {scene}. {text}",
             "accessible": f"This video shows a {scene}. The speaker says: {text}"
         }
+        return {style: captions[style] for style in styles}
     
     def _generate_fallback_caption(self, transcript: Dict, visual_analysis: Dict, style: str) -> str:
         """Generate single fallback caption"""
@@ -453,6 +986,14 @@ class VideoProcessor:
 # Initialize processor
 video_processor = VideoProcessor()
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Remove the processor's working directory and close service connections"""
+    if video_processor.workdir is not None:
+        shutil.rmtree(video_processor.workdir, ignore_errors=True)
+    if service_client is not None:
+        await service_client.aclose()
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -466,16 +1007,29 @@ async def root():
         }
     }
 
+def parse_styles(styles: str) -> List[str]:
+    """Parse the comma-separated styles form field"""
+    requested_styles = [style.strip() for style in styles.split(",") if style.strip()]
+    unknown_styles = [style for style in requested_styles if style not in CAPTION_STYLES]
+    if not requested_styles or unknown_styles:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported caption styles. Choose from: {', '.join(CAPTION_STYLES)}"
+        )
+    return requested_styles
+
 @app.post("/process-video")
-async def process_video(file: UploadFile = File(...)):
+async def process_video(file: UploadFile = File(...), styles: str = Form(",".join(CAPTION_STYLES))):
     """Process uploaded video and return enhanced captions"""
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file provided")
     
+    requested_styles = parse_styles(styles)
+    
     logger.info(f"Processing video: {file.filename}")
     
     try:
-        result = await video_processor.process_video(file)
+        result = await video_processor.process_video(file, requested_styles)
         return JSONResponse(content=result)
     
     except HTTPException:
@@ -484,17 +1038,182 @@ async def process_video(file: UploadFile = File(...)):
         logger.error(f"Unexpected error: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+def prune_jobs():
+    """Forget finished jobs once they are older than JOB_TTL"""
+    now = datetime.now()
+    expired = [
+        job_id for job_id, job in jobs.items()
+        if job["finished_at"] and (now - job["finished_at"]).total_seconds() > JOB_TTL
+    ]
+    for job_id in expired:
+        del jobs[job_id]
+
+async def run_job(job_id: str, temp_path: str, content_hash: str, styles: List[str], start_time: datetime):
+    """Process a saved upload in the background and record the outcome on the job"""
+    job = jobs[job_id]
+    
+    def report(stage: str, fraction: float):
+        job["stage"] = stage
+        job["progress"] = fraction
+    
+    job["status"] = "processing"
+    try:
+        job["result"] = await video_processor.process_saved_video(
+            temp_path, styles, start_time, report, content_hash=content_hash
+        )
+        job["status"] = "completed"
+        report("completed", 1.0)
+    except asyncio.CancelledError:
+        logger.info(f"Job {job_id} cancelled")
+        job["status"] = "cancelled"
+    except HTTPException as e:
+        job["status"] = "failed"
+        job["error"] = e.detail
+    except Exception as e:
+        logger.error(f"Error processing job {job_id}: {str(e)}")
+        job["status"] = "failed"
+        job["error"] = str(e)
+    finally:
+        job["finished_at"] = datetime.now()
+
+@app.post("/jobs")
+async def create_job(file: UploadFile = File(...), styles: str = Form(",".join(CAPTION_STYLES))):
+    """Accept a video for background processing and return a job id to follow"""
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="No file provided")
+    
+    requested_styles = parse_styles(styles)
+    start_time = datetime.now()
+    
+    # The upload is only readable during this request, so persist it first
+    temp_path, content_hash = await video_processor.save_upload(file)
+    
+    prune_jobs()
+    job_id = uuid.uuid4().hex
+    jobs[job_id] = {
+        "status": "queued",
+        "stage": "queued",
+        "progress": 0.0,
+        "result": None,
+        "error": None,
+        "finished_at": None
+    }
+    task = asyncio.create_task(run_job(job_id, temp_path, content_hash, requested_styles, start_time))
+    jobs[job_id]["task"] = task
+    
+    def finish_unstarted(task: asyncio.Task):
+        # A job cancelled before run_job started never reaches its handlers
+        job = jobs.get(job_id)
+        if task.cancelled() and job and job["status"] not in FINISHED_STATUSES:
+            job["status"] = "cancelled"
+            job["finished_at"] = datetime.now()
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+    
+    task.add_done_callback(finish_unstarted)
+    
+    logger.info(f"Queued job {job_id} for video: {file.filename}")
+    return {"job_id": job_id, "status": "queued"}
+
+@app.get("/progress/{job_id}")
+async def job_progress(job_id: str):
+    """Stream job progress as Server-Sent Events until the job finishes"""
+    if job_id not in jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def event_stream():
+        last_event = None
+        idle = 0.0
+        while True:
+            job = jobs.get(job_id)
+            if job is None:
+                return
+            
+            event = {"job_id": job_id, "status": job["status"], "stage": job["stage"], "progress": job["progress"]}
+            if job["status"] == "completed":
+                event["result"] = job["result"]
+            elif job["status"] == "failed":
+                event["error"] = job["error"]
+            
+            if event != last_event:
+                yield f"data: {json.dumps(event)}\n\n"
+                last_event = event
+                idle = 0.0
+            elif idle >= 15:
+                # Comment line keeps proxies and client read timeouts from closing the stream
+                yield ": keep-alive\n\n"
+                idle = 0.0
+            
+            if job["status"] in FINISHED_STATUSES:
+                return
+            
+            await asyncio.sleep(0.25)
+            idle += 0.25
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+@app.post("/cancel/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job"""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if job["status"] in FINISHED_STATUSES:
+        return {"job_id": job_id, "status": job["status"]}
+    
+    # The job turns "cancelled" once any running Whisper/CLIP workers have returned
+    if job["status"] != "cancelling":
+        job["status"] = "cancelling"
+        job["task"].cancel()
+    return {"job_id": job_id, "status": "cancelling"}
+
+async def internal_transcribe(request: Request):
+    """ASR stage for an orchestrating backend; the request body is the raw video"""
+    temp_path, _ = await video_processor.save_stream(request.stream())
+    try:
+        await video_processor._load_video_info(temp_path)
+        return await asyncio.to_thread(video_processor._extract_and_transcribe, temp_path)
+    finally:
+        os.unlink(temp_path)
+
+async def internal_analyze_frames(request: Request):
+    """Vision stage for an orchestrating backend; the request body is the raw video"""
+    temp_path, _ = await video_processor.save_stream(request.stream())
+    try:
+        await video_processor._load_video_info(temp_path)
+        return await asyncio.to_thread(video_processor._extract_and_analyze_frames, temp_path)
+    finally:
+        os.unlink(temp_path)
+
+# Stage endpoints exist only on the role services, never on the public API
+if MODE == "asr":
+    app.post("/internal/transcribe")(internal_transcribe)
+elif MODE == "vision":
+    app.post("/internal/analyze-frames")(internal_analyze_frames)
+
+def model_status(model, service_url: Optional[str]) -> str:
+    """Health label for a model that is loaded here, served remotely, or missing"""
+    if model is not None:
+        return "loaded"
+    return "remote" if MODE == "all" and service_url else "not loaded"
+
 @app.get("/health")
 async def health_check():
     """Detailed health check"""
     return {
         "status": "healthy",
+        "mode": MODE,
         "models": {
-            "whisper": "loaded" if whisper_model else "not loaded",
-            "clip": "loaded" if clip_model else "not loaded"
+            "whisper": model_status(whisper_model, ASR_SERVICE_URL),
+            "clip": model_status(clip_model, VISION_SERVICE_URL)
         },
         "device": device,
-        "openai_configured": bool(openai.api_key)
+        "openai_configured": openai_client is not None
     }
 
 if __name__ == "__main__":
@@ -24,8 +24,8 @@ def check_models():
         print("\n🔍 Testing model loading...")
         
         # Test Whisper
-        import whisper
-        print("✅ Whisper can be imported")
+        import faster_whisper
+        print("✅ faster-whisper can be imported")
         
         # Test CLIP
         import clip
@@ -54,15 +54,15 @@ def main():
         ("fastapi", "Web framework"),
         ("uvicorn", "ASGI server"),
         ("streamlit", "Frontend framework"),
-        ("whisper", "Speech recognition"),
+        ("faster_whisper", "Speech recognition"),
         ("clip", "Computer vision"),
         ("torch", "Deep learning"),
         ("torchvision", "Computer vision"),
-        ("moviepy", "Video processing"),
         ("cv2", "OpenCV - Image processing"),
         ("PIL", "Image library"),
         ("openai", "GPT integration"),
         ("requests", "HTTP client"),
+        ("httpx", "Async HTTP client"),
         ("numpy", "Numerical computing")
     ]
     